@@ -1,5 +1,7 @@
 import json
 
+from .capture import configure_record_capture
+from .collector import CollectorHandler, LogCollector
 from .dictconfig import json_formatter_factory
 from .formatters import (
     default_json_encoder,
@@ -7,11 +9,14 @@ from .formatters import (
     JsonFormatter,
     WrapedJsonFormatter
 )
+from .metrics import Metrics, MetricsReporter
 from .recordadapter import (
     default_record_adapter,
     default_template,
     ValueRecordAdapter
 )
+from .shedding import SheddingHandler
+from .shipper import LocalLineServer, ShipperHandler
 
 
 __version__ = "0.0.3"
@@ -0,0 +1,89 @@
+"""
+Avoid capturing LogRecord attributes which no template uses.
+
+By default the logging module finds the caller of every log call by walking
+the stack, and looks up the current thread, process ID and multiprocessing
+process name, even if no formatter uses them. configure_record_capture()
+inspects the templates in use and switches off the lookups whose results
+none of them need.
+
+The settings are global to the logging module, so every formatter in the
+process should be accounted for. A template containing a Value which doesn't
+have a get_record_attributes() method might use any attribute, so every
+lookup is switched on.
+"""
+
+import logging
+import os
+
+from .values import get_record_attributes
+
+
+CALLER_ATTRIBUTES = frozenset(
+    ["pathname", "filename", "module", "lineno", "funcName"])
+THREAD_ATTRIBUTES = frozenset(["thread", "threadName"])
+PROCESS_ATTRIBUTES = frozenset(["process"])
+PROCESS_NAME_ATTRIBUTES = frozenset(["processName"])
+
+# The value logging._srcfile has by default, calculated the same way as the
+# logging module does, in case it has already been set to None.
+_LOGGING_SRCFILE = os.path.normcase(
+    logging.Logger.findCaller.__code__.co_filename)
+
+
+def get_template_record_attributes(templates):
+    """
+    Get the set of LogRecord attribute names used by a sequence of templates,
+    or None if it can't be determined.
+    """
+    attributes = set()
+    for template in templates:
+        template_attributes = get_record_attributes(template)
+        if template_attributes is None:
+            return None
+        attributes.update(template_attributes)
+    return attributes
+
+
+def configure_record_capture(*templates):
+    """
+    Configure the logging module to populate only the LogRecord attributes
+    used by `templates`. Lookups which are needed are switched on, even if an
+    earlier call switched them off, so the configuration only reflects the
+    templates passed to the latest call. If the templates' attributes can't
+    be determined, every lookup is switched on.
+
+    Returns a list of the names of the lookups which are switched off. These
+    are "caller" (the stack walk to find pathname, lineno and funcName),
+    "threads", "processes" and "multiprocessing".
+
+    At least one template must be given, as calling this with none would
+    switch off every lookup.
+    """
+    if not templates:
+        raise TypeError(
+            "configure_record_capture() requires at least one template")
+
+    attributes = get_template_record_attributes(templates)
+    if attributes is None:
+        attributes = (CALLER_ATTRIBUTES | THREAD_ATTRIBUTES |
+                      PROCESS_ATTRIBUTES | PROCESS_NAME_ATTRIBUTES)
+
+    needs_caller = bool(attributes & CALLER_ATTRIBUTES)
+    needs_threads = bool(attributes & THREAD_ATTRIBUTES)
+    needs_processes = bool(attributes & PROCESS_ATTRIBUTES)
+    needs_process_names = bool(attributes & PROCESS_NAME_ATTRIBUTES)
+
+    # The logging module documents setting _srcfile to None as the way to
+    # stop it calling findCaller()
+    logging._srcfile = _LOGGING_SRCFILE if needs_caller else None
+    logging.logThreads = int(needs_threads)
+    logging.logProcesses = int(needs_processes)
+    logging.logMultiprocessing = int(needs_process_names)
+
+    return [name for (name, needed) in [
+        ("caller", needs_caller),
+        ("threads", needs_threads),
+        ("processes", needs_processes),
+        ("multiprocessing", needs_process_names)
+    ] if not needed]
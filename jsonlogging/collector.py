@@ -0,0 +1,388 @@
+"""
+Support for funnelling the log output of many worker processes through a
+single collector process.
+
+Workers attach a CollectorHandler to their loggers. It buffers formatted
+records and sends them to the collector in length-prefixed frames over a
+Unix domain socket. The LogCollector reads these frames and writes them to
+its output stream in large sequential writes. Because a frame only ever
+contains whole lines, lines from different workers can't interleave.
+
+A frame is a 4 byte big-endian payload length followed by the payload. The
+payload is one or more newline terminated log lines.
+"""
+
+import errno
+import logging
+import os
+import select
+import socket
+import stat
+import struct
+
+from .metrics import Metrics
+
+
+FRAME_HEADER = struct.Struct(">I")
+
+
+def encode_frame(lines):
+    """
+    Create a frame containing the sequence of log line strings `lines`.
+    """
+    payload = "\n".join(lines) + "\n"
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+
+class FrameTooLargeError(Exception):
+    """
+    Raised by FrameDecoder when a frame header declares a payload larger
+    than the decoder's max_frame_size.
+    """
+
+
+class FrameDecoder(object):
+    """
+    Incrementally splits a stream of bytes into frame payloads.
+    """
+    def __init__(self, max_frame_size):
+        self._max_frame_size = max_frame_size
+        self._buffer = bytearray()
+
+    def feed(self, data):
+        """
+        Add data received from the stream and return a list of the payloads
+        of any frames which are now complete.
+        """
+        self._buffer.extend(data)
+
+        payloads = []
+        offset = 0
+        header_size = FRAME_HEADER.size
+        while len(self._buffer) - offset >= header_size:
+            (size,) = FRAME_HEADER.unpack_from(self._buffer, offset)
+            if size > self._max_frame_size:
+                raise FrameTooLargeError(size)
+
+            end = offset + header_size + size
+            if len(self._buffer) < end:
+                break
+            payloads.append(bytes(self._buffer[offset + header_size:end]))
+            offset = end
+
+        del self._buffer[:offset]
+        return payloads
+
+    def has_partial_frame(self):
+        """
+        Returns True if some bytes of an incomplete frame have been received.
+        """
+        return len(self._buffer) > 0
+
+
+class CollectorHandler(logging.Handler):
+    """
+    A logging.Handler which sends formatted records to a LogCollector.
+
+    Records are formatted in the worker (normally by a JsonFormatter) and
+    buffered. The buffer is sent as a single frame when it holds
+    `batch_size` records or `batch_bytes` bytes, when a record at or above
+    `flush_level` is handled, or when flush() or close() is called.
+
+    Sends block for at most `timeout` seconds. If the collector is not
+    running or can't keep up, the buffered records are dropped rather than
+    stalling the worker, and counted in get_dropped_count(). The connection
+    is re-established on the next send.
+
+    The handler's Metrics count the records and bytes sent and records
+    dropped, and report the number of buffered records as "queue_depth".
+    """
+    def __init__(self, address, batch_size=100, batch_bytes=64 * 1024,
+                 flush_level=logging.ERROR, timeout=1.0):
+        super(CollectorHandler, self).__init__()
+
+        self._address = address
+        self._batch_size = batch_size
+        self._batch_bytes = batch_bytes
+        self._flush_level = flush_level
+        self._timeout = timeout
+
+        self._socket = None
+        self._pid = os.getpid()
+        self._lines = []
+        self._buffered_bytes = 0
+        self._metrics = Metrics()
+        self._metrics.add_gauge("queue_depth", self.get_queue_depth)
+
+    def get_address(self):
+        return self._address
+
+    def get_dropped_count(self):
+        """
+        Get the number of records which could not be sent to the collector.
+        """
+        return self._metrics.get("records_dropped")
+
+    def get_metrics(self):
+        return self._metrics
+
+    def get_queue_depth(self):
+        """
+        Get the number of records buffered and waiting to be sent.
+        """
+        return len(self._lines)
+
+    def emit(self, record):
+        try:
+            line = self.format(record)
+            if isinstance(line, unicode):
+                line = line.encode("utf-8")
+        except Exception:
+            self.handleError(record)
+            return
+
+        self._check_forked()
+        self._lines.append(line)
+        self._buffered_bytes += len(line) + 1
+
+        if (len(self._lines) >= self._batch_size or
+                self._buffered_bytes >= self._batch_bytes or
+                record.levelno >= self._flush_level):
+            self.flush()
+
+    def flush(self):
+        self.acquire()
+        try:
+            self._check_forked()
+            if not self._lines:
+                return
+
+            frame = encode_frame(self._lines)
+            try:
+                if self._socket is None:
+                    self._socket = self._connect()
+                self._socket.sendall(frame)
+            except socket.error:
+                # A partial frame may have been sent, so the connection
+                # can't be reused. The collector discards partial frames.
+                self._close_socket()
+                self._metrics.increment("records_dropped", len(self._lines))
+            else:
+                self._metrics.increment("records_sent", len(self._lines))
+                self._metrics.increment("bytes_sent", len(frame))
+
+            self._lines = []
+            self._buffered_bytes = 0
+        finally:
+            self.release()
+
+    def close(self):
+        self.acquire()
+        try:
+            self.flush()
+            self._close_socket()
+        finally:
+            self.release()
+        super(CollectorHandler, self).close()
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self._timeout)
+        try:
+            sock.connect(self._address)
+        except socket.error:
+            sock.close()
+            raise
+        return sock
+
+    def _close_socket(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+    def _check_forked(self):
+        """
+        Discard state inherited from a parent process. Sharing the parent's
+        connection would interleave frames, and its buffered records would
+        be sent twice.
+        """
+        pid = os.getpid()
+        if pid != self._pid:
+            self._pid = pid
+            # Closing our copy of the parent's socket leaves the parent's
+            # connection open, but lets the collector see EOF once the
+            # parent closes it.
+            self._close_socket()
+            self._lines = []
+            self._buffered_bytes = 0
+
+
+class LogCollector(object):
+    """
+    Receives frames of log lines from CollectorHandlers and writes them to
+    `stream`.
+
+    Received lines are buffered and written once `write_size` bytes are
+    waiting, or whenever the collector is idle. While the collector is
+    writing it is not reading, so a slow stream applies backpressure to the
+    workers through their socket buffers, and eventually causes them to drop
+    records instead of blocking.
+
+    A worker which exits part way through sending a frame only loses that
+    frame; the partial frame is discarded and counted in get_stats().
+
+    The collector is single threaded. Either call serve_forever(), or call
+    handle_events() repeatedly from your own loop.
+    """
+    def __init__(self, address, stream, write_size=256 * 1024,
+                 max_frame_size=16 * 1024 * 1024, backlog=128):
+        self._address = address
+        self._stream = stream
+        self._write_size = write_size
+        self._max_frame_size = max_frame_size
+
+        self._clients = {}
+        self._pending = []
+        self._pending_bytes = 0
+        self._shutdown = False
+        self._stats = {
+            "connections": 0,
+            "frames": 0,
+            "records": 0,
+            "bytes_written": 0,
+            "writes": 0,
+            "partial_frames": 0,
+            "oversized_frames": 0
+        }
+
+        self._listener = self._listen(backlog)
+
+    def get_address(self):
+        return self._address
+
+    def get_stats(self):
+        """
+        Get a dict of counters describing the collector's activity.
+        """
+        return dict(self._stats)
+
+    def fileno(self):
+        return self._listener.fileno()
+
+    def serve_forever(self, poll_interval=0.5):
+        """
+        Handle events until shutdown() is called.
+        """
+        while not self._shutdown:
+            self.handle_events(poll_interval)
+        self.flush()
+
+    def shutdown(self):
+        self._shutdown = True
+
+    def handle_events(self, timeout=0):
+        """
+        Wait up to `timeout` seconds for activity, then accept new workers
+        and read any frames they've sent.
+        """
+        readers = [self._listener] + list(self._clients)
+        try:
+            readable, _, _ = select.select(readers, [], [], timeout)
+        except select.error as e:
+            if e.args[0] != errno.EINTR:
+                raise
+            readable = []
+
+        if not readable:
+            self.flush()
+            return
+
+        for sock in readable:
+            if sock is self._listener:
+                self._accept()
+            else:
+                self._read(sock)
+
+        if self._pending_bytes >= self._write_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Write all buffered lines to the stream.
+        """
+        if not self._pending:
+            return
+
+        data = b"".join(self._pending)
+        self._pending = []
+        self._pending_bytes = 0
+
+        self._stream.write(data)
+        self._stream.flush()
+        self._stats["writes"] += 1
+        self._stats["bytes_written"] += len(data)
+
+    def close(self):
+        self.flush()
+        for sock in list(self._clients):
+            self._disconnect(sock)
+        self._listener.close()
+        if os.path.exists(self._address):
+            os.unlink(self._address)
+
+    def _listen(self, backlog):
+        # Remove a socket file left behind by a collector which crashed
+        try:
+            if stat.S_ISSOCK(os.stat(self._address).st_mode):
+                os.unlink(self._address)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(self._address)
+        listener.listen(backlog)
+        return listener
+
+    def _accept(self):
+        try:
+            sock, _ = self._listener.accept()
+        except socket.error as e:
+            if e.args[0] in (errno.EAGAIN, errno.EINTR, errno.ECONNABORTED):
+                return
+            raise
+
+        self._clients[sock] = FrameDecoder(self._max_frame_size)
+        self._stats["connections"] += 1
+
+    def _read(self, sock):
+        decoder = self._clients[sock]
+        try:
+            data = sock.recv(64 * 1024)
+        except socket.error as e:
+            if e.args[0] in (errno.EAGAIN, errno.EINTR):
+                return
+            data = b""
+
+        if not data:
+            if decoder.has_partial_frame():
+                self._stats["partial_frames"] += 1
+            self._disconnect(sock)
+            return
+
+        try:
+            payloads = decoder.feed(data)
+        except FrameTooLargeError:
+            self._stats["oversized_frames"] += 1
+            self._disconnect(sock)
+            return
+
+        for payload in payloads:
+            self._pending.append(payload)
+            self._pending_bytes += len(payload)
+            self._stats["frames"] += 1
+            self._stats["records"] += payload.count(b"\n")
+
+    def _disconnect(self, sock):
+        del self._clients[sock]
+        sock.close()
@@ -1,10 +1,11 @@
 import json
 
 from .formatters import WrapedJsonFormatter
+from .metrics import Metrics
 from .recordadapter import default_record_adapter
 
 
-def json_formatter_factory(json_encoder={}, format="{json}"):
+def json_formatter_factory(json_encoder={}, format="{json}", metrics=True):
     """
     A factory to create JsonFormatter instances from dictconfig logging
     configurations.
@@ -16,13 +17,15 @@ def json_formatter_factory(json_encoder={}, format="{json}"):
         json_encoder:
           indent: 0
           separators: [", ", ": "]
+        metrics: true
 
     Customising the record template is not yet supported through this
     dictconfig factory.
     """
     encoder = json_encoder_factory(**json_encoder)
 
-    return WrapedJsonFormatter(format, encoder, default_record_adapter())
+    return WrapedJsonFormatter(format, encoder, default_record_adapter(),
+                               Metrics() if metrics else None)
 
 
 def json_encoder_factory(
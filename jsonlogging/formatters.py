@@ -1,12 +1,24 @@
 import json
+from timeit import default_timer
 
+from .metrics import Metrics
 from .recordadapter import default_record_adapter
 
 
-def get_json_formatter(json_encoder=None, record_adapter=None):
+def get_json_formatter(json_encoder=None, record_adapter=None, metrics=True):
+    """
+    Create a JsonFormatter. `metrics` may be True to record metrics in a new
+    Metrics instance, False to record none, or a Metrics instance to use.
+    """
+    if metrics is True:
+        metrics = Metrics()
+    elif metrics is False:
+        metrics = None
+
     return JsonFormatter(
         json_encoder or default_json_encoder(),
-        record_adapter or default_record_adapter()
+        record_adapter or default_record_adapter(),
+        metrics
     )
 
 
@@ -19,10 +31,20 @@ def default_json_encoder():
 
 
 class JsonFormatter(object):
+    """
+    Formats LogRecords as JSON.
 
-    def __init__(self, json_encoder, record_adapter):
+    If a Metrics instance is provided, it counts the records formatted
+    ("records_formatted"), the characters produced ("chars_emitted"),
+    records with exception info ("exceptions_rendered") and records which
+    failed to format ("format_errors"), and times each call to format()
+    ("encode_seconds").
+    """
+
+    def __init__(self, json_encoder, record_adapter, metrics=None):
         self._encoder = json_encoder
         self._adapter = record_adapter
+        self._metrics = metrics
 
     def get_encoder(self):
         return self._encoder
@@ -30,7 +52,29 @@ class JsonFormatter(object):
     def get_adapter(self):
         return self._adapter
 
+    def get_metrics(self):
+        return self._metrics
+
     def format(self, record):
+        metrics = self._metrics
+        if metrics is None:
+            return self.format_record(record)
+
+        start = default_timer()
+        try:
+            output = self.format_record(record)
+        except Exception:
+            metrics.increment("format_errors")
+            raise
+        metrics.observe("encode_seconds", default_timer() - start)
+
+        metrics.increment("records_formatted")
+        metrics.increment("chars_emitted", len(output))
+        if getattr(record, "exc_info", None):
+            metrics.increment("exceptions_rendered")
+        return output
+
+    def format_record(self, record):
         json = self.get_adapter().to_json(record)
         return self.get_encoder().encode(json)
 
@@ -41,16 +85,16 @@ class WrapedJsonFormatter(JsonFormatter):
     string, allowing the JSON log entry to be surrounded in arbitary text.
     """
 
-    def __init__(self, format, json_encoder, record_adapter):
+    def __init__(self, format, json_encoder, record_adapter, metrics=None):
         super(WrapedJsonFormatter, self).__init__(
-            json_encoder, record_adapter)
+            json_encoder, record_adapter, metrics)
 
         self._format = format
 
     def get_format(self):
         return self._format
 
-    def format(self, record):
-        json = super(WrapedJsonFormatter, self).format(record)
+    def format_record(self, record):
+        json = super(WrapedJsonFormatter, self).format_record(record)
 
         return self.get_format().format(json=json)
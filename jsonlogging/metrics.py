@@ -0,0 +1,174 @@
+"""
+Cheap performance counters for jsonlogging's formatters and handlers.
+
+JsonFormatter and the handlers in this package keep a Metrics instance
+which is available from their get_metrics() method. Metrics.snapshot()
+returns the current values as a JSON-compatible dict. A MetricsReporter can
+log snapshots periodically so that logging overhead can be monitored and
+alerted on like any other log data.
+
+Updating a metric costs about as much as a dict lookup and an addition, so
+metrics are cheap enough to leave enabled. Counters are not locked, so
+updates made concurrently from several threads may occasionally be lost.
+"""
+
+import bisect
+import collections
+import logging
+import threading
+
+
+class Histogram(object):
+    """
+    Counts observed values in fixed buckets, and keeps their count, sum and
+    maximum.
+
+    `bounds` is an ascending sequence of bucket upper bounds. Values larger
+    than the last bound are counted in an overflow bucket.
+    """
+    def __init__(self, bounds):
+        self._bounds = list(bounds)
+        self._buckets = [0] * (len(self._bounds) + 1)
+        self._count = 0
+        self._sum = 0
+        self._max = None
+
+    def observe(self, value):
+        self._buckets[bisect.bisect_left(self._bounds, value)] += 1
+        self._count += 1
+        self._sum += value
+        if self._max is None or value > self._max:
+            self._max = value
+
+    def snapshot(self):
+        """
+        Get the histogram as a dict. The buckets are a list of
+        [upper bound, count] pairs, the last of which has a bound of None.
+        """
+        return {
+            "count": self._count,
+            "sum": self._sum,
+            "max": self._max,
+            "buckets": [[bound, count] for (bound, count)
+                        in zip(self._bounds + [None], self._buckets)]
+        }
+
+
+# Upper bounds for timings measured in seconds, from 10us to 1s
+DEFAULT_TIME_BOUNDS = (
+    0.00001, 0.00002, 0.00005, 0.0001, 0.0002, 0.0005, 0.001, 0.002,
+    0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0
+)
+
+
+class Metrics(object):
+    """
+    A set of named counters, gauges and histograms.
+
+    Counters are incremented, histograms record observed timings, and gauges
+    are functions called to read a current value (e.g. a queue depth) when a
+    snapshot is taken.
+    """
+    def __init__(self, time_bounds=DEFAULT_TIME_BOUNDS):
+        self._time_bounds = time_bounds
+        self._counters = collections.defaultdict(int)
+        self._histograms = {}
+        self._gauges = {}
+
+    def increment(self, name, count=1):
+        self._counters[name] += count
+
+    def get(self, name):
+        """
+        Get the value of a counter.
+        """
+        return self._counters.get(name, 0)
+
+    def observe(self, name, seconds):
+        """
+        Record a timing in the histogram `name`.
+        """
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            histogram = self._histograms[name] = Histogram(self._time_bounds)
+        histogram.observe(seconds)
+
+    def add_gauge(self, name, function):
+        self._gauges[name] = function
+
+    def snapshot(self):
+        """
+        Get the current value of every metric as a JSON-compatible dict.
+        """
+        return {
+            "counters": dict(self._counters),
+            "gauges": dict((name, function())
+                           for (name, function) in self._gauges.items()),
+            "histograms": dict((name, histogram.snapshot())
+                               for (name, histogram)
+                               in self._histograms.items())
+        }
+
+
+def snapshot(sources):
+    """
+    Get a snapshot of several objects' metrics. `sources` maps a name to a
+    Metrics instance or to an object with a get_metrics() method, such as a
+    JsonFormatter. The returned dict maps the same names to the snapshots.
+    Sources without metrics, such as a formatter created with metrics=False,
+    are left out.
+    """
+    snapshots = {}
+    for name, source in sources.items():
+        source_metrics = _get_metrics(source)
+        if source_metrics is not None:
+            snapshots[name] = source_metrics.snapshot()
+    return snapshots
+
+
+def _get_metrics(source):
+    if isinstance(source, Metrics):
+        return source
+    return source.get_metrics()
+
+
+class MetricsReporter(object):
+    """
+    Periodically logs a snapshot of the metrics of `sources` (as accepted by
+    snapshot()) every `interval` seconds.
+
+    Snapshots are logged at INFO level to `logger` (the
+    "jsonlogging.metrics" logger by default) as the args of the record, so
+    a JsonFormatter with the default template includes them in the record's
+    message args.
+
+    Call start() to begin reporting from a background thread, or call
+    report() yourself.
+    """
+    message = "jsonlogging metrics"
+
+    def __init__(self, sources, interval=60.0, logger=None):
+        self._sources = sources
+        self._interval = interval
+        self._logger = logger or logging.getLogger("jsonlogging.metrics")
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def report(self):
+        self._logger.info(self.message, snapshot(self._sources))
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._run, name="jsonlogging-metrics")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stopping.wait(self._interval):
+            self.report()
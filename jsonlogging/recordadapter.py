@@ -58,5 +58,8 @@ class ValueRecordAdapter(object):
     def __init__(self, value_template):
         self._value_template = value_template
 
+    def get_template(self):
+        return self._value_template
+
     def to_json(self, record):
         return self._value_template.render(record)
@@ -0,0 +1,187 @@
+"""
+Load shedding for log handlers.
+
+When log volume spikes, formatting and writing every record can add more
+latency than the application can afford. A SheddingHandler sits in front of
+another handler and drops or samples low-severity records while the volume
+is over budget, keeping a count of what it dropped and periodically logging
+a summary of it.
+"""
+
+import bisect
+import collections
+import logging
+import time
+
+from .metrics import Metrics
+
+
+class SheddingHandler(logging.Handler):
+    """
+    A logging.Handler which passes records on to a `target` handler unless
+    the target is overloaded.
+
+    The target counts as overloaded when `records_per_second` records have
+    already been passed to it in the current second, or when
+    `max_queue_depth` is given and the target's get_queue_depth() (as
+    provided by CollectorHandler and ShipperHandler) reports at least that
+    many waiting records.
+
+    Records at or above `protect_level`, which can't be higher than ERROR,
+    are always passed on. Less severe records are sampled while overloaded:
+    `sample_rates` maps a level to N (at least 1), meaning that 1 in N
+    records at that level (or above it, up to the next level in the map) is
+    kept. Records below the lowest level in the map are all dropped. By
+    default WARNING records are protected, 1 in 10 INFO records are kept,
+    and DEBUG records are dropped. To shed WARNING records as well, lower
+    `protect_level` to ERROR and give WARNING a sample rate.
+
+    Dropped records are counted by logger name and level. A WARNING record
+    summarising the drops is passed to the target when the handler is
+    flushed or closed, and when a record is handled `summary_interval` or
+    more seconds after the last summary. There's no timer, so if logging
+    goes quiet after a spike, the summary waits for the next record, flush()
+    or close(). Its args are a dict like:
+
+        {"total": 1500, "interval": 60.0,
+         "dropped": {"myapp.db": {"DEBUG": 1200, "INFO": 300}}}
+
+    The handler's Metrics count the records passed on and dropped, and
+    report the target's queue depth as "queue_depth".
+    """
+    summary_logger_name = "jsonlogging.shedding"
+    summary_message = (
+        "Shed %(total)d log records in the last %(interval).1f seconds")
+
+    def __init__(self, target, records_per_second=1000, max_queue_depth=None,
+                 protect_level=logging.WARNING, sample_rates=None,
+                 summary_interval=60.0):
+        super(SheddingHandler, self).__init__()
+
+        if sample_rates is None:
+            sample_rates = {logging.INFO: 10}
+        if protect_level > logging.ERROR:
+            raise ValueError(
+                "protect_level must be at most ERROR, got: %r" % protect_level)
+        for level, rate in sample_rates.items():
+            if rate < 1:
+                raise ValueError(
+                    "sample rate for level %r must be at least 1, got: %r"
+                    % (level, rate))
+
+        self._target = target
+        self._records_per_second = records_per_second
+        self._max_queue_depth = max_queue_depth
+        self._protect_level = protect_level
+        self._sample_levels = sorted(sample_rates)
+        self._sample_rates = [sample_rates[l] for l in self._sample_levels]
+        self._summary_interval = summary_interval
+
+        self._second = None
+        self._second_count = 0
+        self._sample_counts = collections.defaultdict(int)
+        self._dropped = collections.defaultdict(int)
+        self._metrics = Metrics()
+        self._metrics.add_gauge("queue_depth", self.get_queue_depth)
+        self._last_summary = time.time()
+
+    def get_target(self):
+        return self._target
+
+    def get_dropped_count(self):
+        """
+        Get the total number of records dropped by this handler.
+        """
+        return self._metrics.get("records_dropped")
+
+    def get_metrics(self):
+        return self._metrics
+
+    def get_queue_depth(self):
+        get_queue_depth = getattr(self._target, "get_queue_depth", None)
+        return get_queue_depth() if get_queue_depth else 0
+
+    def is_overloaded(self, now):
+        second = int(now)
+        if second != self._second:
+            self._second = second
+            self._second_count = 0
+
+        if self._second_count >= self._records_per_second:
+            return True
+        return (self._max_queue_depth is not None and
+                self.get_queue_depth() >= self._max_queue_depth)
+
+    def should_keep(self, record):
+        """
+        Decide whether to keep a record while the target is overloaded.
+        """
+        if record.levelno >= self._protect_level:
+            return True
+
+        index = bisect.bisect_right(self._sample_levels, record.levelno) - 1
+        if index < 0:
+            return False
+
+        level = self._sample_levels[index]
+        count = self._sample_counts[level]
+        self._sample_counts[level] = count + 1
+        return count % self._sample_rates[index] == 0
+
+    def emit(self, record):
+        now = time.time()
+
+        if not self.is_overloaded(now) or self.should_keep(record):
+            self._second_count += 1
+            self._metrics.increment("records_passed")
+            self._target.handle(record)
+        else:
+            self._dropped[(record.name, record.levelname)] += 1
+            self._metrics.increment("records_dropped")
+
+        if now - self._last_summary >= self._summary_interval:
+            self.emit_summary(now)
+
+    def emit_summary(self, now=None):
+        """
+        Pass a record summarising the records dropped since the last summary
+        to the target. Nothing is emitted if no records were dropped.
+        """
+        if now is None:
+            now = time.time()
+
+        interval = now - self._last_summary
+        self._last_summary = now
+        if not self._dropped:
+            return
+
+        dropped = {}
+        for (name, level), count in self._dropped.items():
+            dropped.setdefault(name, {})[level] = count
+        summary = {
+            "total": sum(self._dropped.values()),
+            "interval": interval,
+            "dropped": dropped
+        }
+        self._dropped.clear()
+
+        record = logging.LogRecord(
+            self.summary_logger_name, logging.WARNING, __file__, 0,
+            self.summary_message, (summary,), None, "emit_summary")
+        self._target.handle(record)
+
+    def flush(self):
+        self.acquire()
+        try:
+            self.emit_summary()
+            self._target.flush()
+        finally:
+            self.release()
+
+    def close(self):
+        """
+        Emit a final summary and flush the target. The target is not closed,
+        as it may be used by other handlers.
+        """
+        self.flush()
+        super(SheddingHandler, self).close()
@@ -0,0 +1,469 @@
+"""
+A logging.Handler which ships formatted log lines to a network aggregator.
+
+Unlike logging.handlers.SocketHandler, records are sent as the formatter's
+output (normally JSON from a JsonFormatter) rather than pickled, and are
+batched so that many records share a single send. Sending happens on a
+background thread so that a slow or unavailable peer never blocks the
+threads doing the logging.
+
+LocalLineServer is a stand-in aggregator for tests and benchmarks. Run this
+module to measure throughput against it:
+
+    python -m jsonlogging.shipper [tcp|udp] [record count]
+"""
+
+import errno
+import logging
+import random
+import select
+import socket
+import threading
+import time
+import Queue
+
+from .collector import encode_frame, FrameDecoder
+from .metrics import Metrics
+
+
+class ShipperHandler(logging.Handler):
+    """
+    Sends formatted records to `host`:`port` over a persistent TCP
+    connection or as UDP datagrams.
+
+    Formatted lines are put on a queue holding at most `queue_size` records.
+    If the queue is full the record is dropped and counted in
+    get_dropped_count(). A background thread takes lines from the queue and
+    sends them in batches of up to `batch_size` records or `batch_bytes`
+    bytes, waiting no longer than `flush_interval` seconds to fill a batch.
+
+    TCP batches are newline delimited lines, or frames as produced by
+    collector.encode_frame() if `length_prefixed` is True. Each UDP datagram
+    holds as many whole lines as fit in `batch_bytes`; lines longer than
+    that are dropped.
+
+    When a TCP send fails the connection is reopened and the whole batch
+    retried after a backoff period which starts at `min_backoff` seconds and
+    doubles up to `max_backoff`, with random jitter so that many processes
+    don't reconnect in lockstep. Part of the batch may have reached the peer
+    before the failure, so TCP delivery is at-least-once and the peer may
+    receive some records twice. Records are only counted as sent once their
+    whole batch has been sent. UDP batches aren't retried: if a datagram
+    can't be sent, the lines not yet sent are dropped.
+
+    The handler's Metrics count the records, batches and bytes sent, the
+    records dropped and the number of failed sends ("send_errors"), and
+    report the number of queued records as "queue_depth".
+    """
+
+    def __init__(self, host, port, protocol="tcp", batch_size=500,
+                 batch_bytes=None, flush_interval=1.0, queue_size=10000,
+                 timeout=5.0, min_backoff=0.5, max_backoff=30.0,
+                 length_prefixed=False):
+        super(ShipperHandler, self).__init__()
+
+        if protocol not in ("tcp", "udp"):
+            raise ValueError("protocol must be 'tcp' or 'udp', got: {!r}"
+                             .format(protocol))
+        if batch_bytes is None:
+            batch_bytes = 64 * 1024 if protocol == "tcp" else 8192
+
+        self._address = (host, port)
+        self._protocol = protocol
+        self._batch_size = batch_size
+        self._batch_bytes = batch_bytes
+        self._flush_interval = flush_interval
+        self._timeout = timeout
+        self._min_backoff = min_backoff
+        self._max_backoff = max_backoff
+        self._length_prefixed = length_prefixed
+
+        self._queue = Queue.Queue(queue_size)
+        self._socket = None
+        self._metrics = Metrics()
+        self._metrics.add_gauge("queue_depth", self.get_queue_depth)
+        self._stopping = threading.Event()
+        self._flush_requested = threading.Event()
+
+        self._thread = threading.Thread(
+            target=self._run, name="jsonlogging-shipper")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def get_address(self):
+        return self._address
+
+    def get_protocol(self):
+        return self._protocol
+
+    def get_dropped_count(self):
+        """
+        Get the number of records dropped because the queue was full or the
+        record couldn't be sent.
+        """
+        return self._metrics.get("records_dropped")
+
+    def get_sent_count(self):
+        """
+        Get the number of records sent to the peer.
+        """
+        return self._metrics.get("records_sent")
+
+    def get_metrics(self):
+        return self._metrics
+
+    def get_queue_depth(self):
+        """
+        Get the approximate number of records waiting to be sent.
+        """
+        return self._queue.qsize()
+
+    def emit(self, record):
+        try:
+            line = self.format(record)
+            if isinstance(line, unicode):
+                line = line.encode("utf-8")
+        except Exception:
+            self.handleError(record)
+            return
+
+        try:
+            self._queue.put_nowait(line)
+        except Queue.Full:
+            self._metrics.increment("records_dropped")
+
+    def flush(self):
+        """
+        Ask the background thread to send the records it's holding without
+        waiting for its batch to fill. This does not wait for the send.
+        """
+        self._flush_requested.set()
+
+    def close(self, timeout=None):
+        """
+        Stop the background thread, giving it up to `timeout` seconds
+        (default: the handler's send timeout) to send queued records.
+        """
+        if not self._stopping.is_set():
+            self._stopping.set()
+            self._thread.join(self._timeout if timeout is None else timeout)
+        super(ShipperHandler, self).close()
+
+    def _run(self):
+        backoff = self._min_backoff
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                if self._stopping.is_set():
+                    break
+                continue
+
+            while not self._send_batch(batch):
+                if self._stopping.is_set():
+                    # Don't hold up shutdown retrying an unavailable peer
+                    self._metrics.increment(
+                        "records_dropped", len(batch) + self._queue.qsize())
+                    self._close_socket()
+                    return
+                self._stopping.wait(backoff * random.uniform(0.5, 1.5))
+                backoff = min(backoff * 2, self._max_backoff)
+            backoff = self._min_backoff
+
+        self._close_socket()
+
+    def _next_batch(self):
+        """
+        Collect a batch of lines from the queue, returning an empty list if
+        none arrive within the flush interval.
+        """
+        batch = []
+        size = 0
+        deadline = time.time() + self._flush_interval
+        while len(batch) < self._batch_size and size < self._batch_bytes:
+            if self._stopping.is_set() or self._flush_requested.is_set():
+                wait = 0
+            else:
+                wait = deadline - time.time()
+
+            try:
+                if wait > 0:
+                    line = self._queue.get(True, min(wait, 0.1))
+                else:
+                    line = self._queue.get_nowait()
+            except Queue.Empty:
+                if wait <= 0:
+                    break
+                continue
+
+            batch.append(line)
+            size += len(line) + 1
+
+        if self._queue.empty():
+            self._flush_requested.clear()
+        return batch
+
+    def _send_batch(self, batch):
+        """
+        Send a batch, returning False if it should be retried. UDP batches
+        are only retried if the socket couldn't be created.
+        """
+        try:
+            if self._socket is None:
+                self._socket = self._connect()
+
+            if self._protocol == "tcp":
+                if self._length_prefixed:
+                    payload = encode_frame(batch)
+                else:
+                    payload = "\n".join(batch) + "\n"
+                self._socket.sendall(payload)
+                self._metrics.increment("records_sent", len(batch))
+                self._metrics.increment("bytes_sent", len(payload))
+            elif not self._send_datagrams(batch):
+                return True
+        except socket.error:
+            self._metrics.increment("send_errors")
+            self._close_socket()
+            return False
+
+        self._metrics.increment("batches_sent")
+        return True
+
+    def _send_datagrams(self, batch):
+        """
+        Send a batch as datagrams, returning False if any weren't sent. If a
+        send fails, the datagrams already sent aren't resent. The lines which
+        weren't sent are dropped instead.
+        """
+        datagrams = []
+        datagram = []
+        size = 0
+        for line in batch:
+            if len(line) + 1 > self._batch_bytes:
+                self._metrics.increment("records_dropped")
+                continue
+            if size + len(line) + 1 > self._batch_bytes:
+                datagrams.append(datagram)
+                datagram = []
+                size = 0
+            datagram.append(line)
+            size += len(line) + 1
+        if datagram:
+            datagrams.append(datagram)
+
+        for (index, lines) in enumerate(datagrams):
+            payload = "\n".join(lines) + "\n"
+            try:
+                self._socket.send(payload)
+            except socket.error:
+                self._metrics.increment("send_errors")
+                self._metrics.increment("records_dropped", sum(
+                    len(unsent) for unsent in datagrams[index:]))
+                self._close_socket()
+                return False
+            self._metrics.increment("records_sent", len(lines))
+            self._metrics.increment("bytes_sent", len(payload))
+        return True
+
+    def _connect(self):
+        if self._protocol == "tcp":
+            sock = socket.create_connection(self._address, self._timeout)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        else:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.connect(self._address)
+        return sock
+
+    def _close_socket(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+
+class LocalLineServer(object):
+    """
+    A stand-in log aggregator which receives lines sent by a ShipperHandler
+    on the local machine. It runs on a background thread and counts the
+    lines and bytes it receives. If `keep_lines` is True, received lines are
+    also kept and available from get_lines().
+
+    Pass port 0 (the default) to listen on a free port, and use
+    get_address() to find which one was chosen.
+    """
+
+    def __init__(self, protocol="tcp", host="127.0.0.1", port=0,
+                 keep_lines=True, length_prefixed=False):
+        self._protocol = protocol
+        self._keep_lines = keep_lines
+        self._length_prefixed = length_prefixed
+
+        self._lock = threading.Lock()
+        self._lines = []
+        self._line_count = 0
+        self._byte_count = 0
+        self._clients = {}
+        self._stopping = False
+
+        if protocol == "tcp":
+            self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._socket.setsockopt(
+                socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self._socket.bind((host, port))
+            self._socket.listen(16)
+        else:
+            self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self._socket.setsockopt(
+                socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+            self._socket.bind((host, port))
+
+        self._thread = threading.Thread(
+            target=self._run, name="jsonlogging-line-server")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def get_address(self):
+        return self._socket.getsockname()
+
+    def get_line_count(self):
+        return self._line_count
+
+    def get_byte_count(self):
+        return self._byte_count
+
+    def get_lines(self):
+        with self._lock:
+            return list(self._lines)
+
+    def disconnect_clients(self):
+        """
+        Close all current client connections, simulating a peer restart.
+        """
+        with self._lock:
+            for sock in list(self._clients):
+                del self._clients[sock]
+                sock.close()
+
+    def wait_for_lines(self, count, timeout=5.0):
+        """
+        Wait until at least `count` lines have been received. Returns True if
+        they were, or False if `timeout` seconds passed first.
+        """
+        deadline = time.time() + timeout
+        while self._line_count < count:
+            if time.time() >= deadline:
+                return False
+            time.sleep(0.005)
+        return True
+
+    def close(self):
+        self._stopping = True
+        self._thread.join()
+        self.disconnect_clients()
+        self._socket.close()
+
+    def _run(self):
+        while not self._stopping:
+            with self._lock:
+                readers = [self._socket] + list(self._clients)
+            try:
+                readable, _, _ = select.select(readers, [], [], 0.05)
+            except select.error as e:
+                if e.args[0] != errno.EINTR:
+                    raise
+                continue
+
+            for sock in readable:
+                if self._protocol == "udp":
+                    self._received(sock.recv(65536))
+                elif sock is self._socket:
+                    client, _ = sock.accept()
+                    with self._lock:
+                        self._clients[client] = [
+                            FrameDecoder(64 * 1024 * 1024), b""]
+                else:
+                    self._read(sock)
+
+    def _read(self, sock):
+        with self._lock:
+            state = self._clients.get(sock)
+        if state is None:
+            return
+
+        try:
+            data = sock.recv(256 * 1024)
+        except socket.error:
+            data = b""
+        if not data:
+            with self._lock:
+                self._clients.pop(sock, None)
+            sock.close()
+            return
+
+        decoder, partial = state
+        if self._length_prefixed:
+            for payload in decoder.feed(data):
+                self._received(payload)
+        else:
+            # Only count complete lines; keep the remainder for next time
+            data = partial + data
+            end = data.rfind(b"\n") + 1
+            state[1] = data[end:]
+            self._received(data[:end])
+
+    def _received(self, data):
+        if not data:
+            return
+        with self._lock:
+            self._line_count += data.count(b"\n")
+            self._byte_count += len(data)
+            if self._keep_lines:
+                self._lines.extend(data.splitlines())
+
+
+def benchmark(protocol="tcp", records=100000):
+    """
+    Ship `records` log records to a LocalLineServer and return a dict
+    describing the throughput achieved.
+    """
+    from .formatters import get_json_formatter
+
+    server = LocalLineServer(protocol, keep_lines=False)
+    host, port = server.get_address()
+    handler = ShipperHandler(host, port, protocol=protocol,
+                             queue_size=records, flush_interval=0.05)
+    handler.setFormatter(get_json_formatter())
+
+    logger = logging.getLogger("jsonlogging.shipper.benchmark")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.handlers = [handler]
+
+    start = time.time()
+    for i in range(records):
+        logger.info("Benchmark record %d", i)
+    logged = time.time()
+    handler.flush()
+    server.wait_for_lines(records - handler.get_dropped_count(), 60)
+    end = time.time()
+
+    handler.close()
+    server.close()
+    return {
+        "protocol": protocol,
+        "records": records,
+        "received": server.get_line_count(),
+        "dropped": handler.get_dropped_count(),
+        "bytes": server.get_byte_count(),
+        "log_seconds": logged - start,
+        "total_seconds": end - start,
+        "records_per_second": records / (end - start)
+    }
+
+
+if __name__ == "__main__":
+    import json
+    import sys
+
+    protocol = sys.argv[1] if len(sys.argv) > 1 else "tcp"
+    records = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+    print(json.dumps(benchmark(protocol, records), indent=2))
@@ -1,6 +1,11 @@
 # Import all the tests to run everything at once
+from jsonlogging.tests.test_capture import *
+from jsonlogging.tests.test_collector import *
 from jsonlogging.tests.test_dictconfig import *
 from jsonlogging.tests.test_formatters import *
 from jsonlogging.tests.test_jsonlogging import *
+from jsonlogging.tests.test_metrics import *
 from jsonlogging.tests.test_record_adapter import *
+from jsonlogging.tests.test_shedding import *
+from jsonlogging.tests.test_shipper import *
 from jsonlogging.tests.test_values import *
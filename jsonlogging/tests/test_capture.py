@@ -0,0 +1,109 @@
+import logging
+import unittest
+
+from jsonlogging import capture, recordadapter, values
+
+
+class TestTemplateRecordAttributes(unittest.TestCase):
+    def test_default_template_attributes(self):
+        self.assertEqual(
+            set(["msg", "args", "exc_info", "name", "levelname", "created",
+                 "pathname", "lineno", "funcName", "process", "processName",
+                 "thread", "threadName"]),
+            capture.get_template_record_attributes(
+                [recordadapter.default_template()])
+        )
+
+    def test_attributes_of_wrapped_values_are_found(self):
+        template = values.OrderedObjectValue([
+            ("args", values.TruncatedValue(values.RecordValue("args"))),
+            ("time", values.DateRecordValue())
+        ])
+        self.assertEqual(
+            set(["args", "created"]),
+            capture.get_template_record_attributes([template])
+        )
+
+    def test_unknown_values_make_attributes_unknown(self):
+        class CustomValue(object):
+            def render(self, record):
+                return record.lineno
+
+        template = values.OrderedObjectValue([
+            ("name", values.RecordValue("name")),
+            ("line", CustomValue())
+        ])
+        self.assertIsNone(capture.get_template_record_attributes([template]))
+
+
+class TestConfigureRecordCapture(unittest.TestCase):
+    settings = ["_srcfile", "logThreads", "logProcesses", "logMultiprocessing"]
+
+    def setUp(self):
+        saved = dict((name, getattr(logging, name)) for name in self.settings)
+
+        def restore():
+            for (name, value) in saved.items():
+                setattr(logging, name, value)
+        self.addCleanup(restore)
+
+    def test_minimal_template_skips_all_lookups(self):
+        template = values.OrderedObjectValue([
+            ("message", values.FormattedMessageRecordValue()),
+            ("level", values.RecordValue("levelname"))
+        ])
+
+        savings = capture.configure_record_capture(template)
+
+        self.assertEqual(
+            ["caller", "threads", "processes", "multiprocessing"], savings)
+        self.assertIsNone(logging._srcfile)
+        self.assertFalse(logging.logThreads)
+        self.assertFalse(logging.logProcesses)
+        self.assertFalse(logging.logMultiprocessing)
+
+        record = logging.getLogger("test_capture").makeRecord(
+            "test_capture", logging.INFO, "(unknown file)", 0, "msg", (), None)
+        self.assertIsNone(record.thread)
+        self.assertIsNone(record.process)
+
+    def test_lookups_used_by_any_template_are_kept(self):
+        savings = capture.configure_record_capture(
+            values.RecordValue("lineno"), values.RecordValue("threadName"))
+
+        self.assertEqual(["processes", "multiprocessing"], savings)
+        self.assertIsNotNone(logging._srcfile)
+        self.assertTrue(logging.logThreads)
+
+    def test_default_template_keeps_everything(self):
+        self.assertEqual([], capture.configure_record_capture(
+            recordadapter.default_template()))
+
+    def test_later_calls_switch_needed_lookups_back_on(self):
+        defaults = [getattr(logging, name) for name in self.settings]
+
+        capture.configure_record_capture(values.RecordValue("msg"))
+        savings = capture.configure_record_capture(
+            recordadapter.default_template())
+
+        self.assertEqual([], savings)
+        self.assertEqual(
+            defaults, [getattr(logging, name) for name in self.settings])
+
+        record = logging.getLogger("test_capture").makeRecord(
+            "test_capture", logging.INFO, "(unknown file)", 0, "msg", (), None)
+        self.assertIsNotNone(record.thread)
+        self.assertIsNotNone(record.process)
+
+    def test_unknown_attributes_switch_everything_on(self):
+        class CustomValue(object):
+            def render(self, record):
+                return record.lineno
+
+        capture.configure_record_capture(values.RecordValue("msg"))
+        self.assertEqual([], capture.configure_record_capture(CustomValue()))
+        self.assertIsNotNone(logging._srcfile)
+        self.assertTrue(logging.logThreads)
+
+    def test_templates_are_required(self):
+        self.assertRaises(TypeError, capture.configure_record_capture)
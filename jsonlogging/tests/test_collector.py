@@ -0,0 +1,148 @@
+import io
+import json
+import logging
+import os
+import shutil
+import socket
+import tempfile
+import unittest
+
+import jsonlogging
+from jsonlogging import collector
+
+
+class TestFrameDecoder(unittest.TestCase):
+    def test_frames_split_across_reads_are_reassembled(self):
+        data = (collector.encode_frame(["a", "b"]) +
+                collector.encode_frame(["c"]))
+        decoder = collector.FrameDecoder(1024)
+
+        payloads = []
+        for i in range(len(data)):
+            payloads.extend(decoder.feed(data[i:i + 1]))
+
+        self.assertEqual(["a\nb\n", "c\n"], payloads)
+        self.assertFalse(decoder.has_partial_frame())
+
+    def test_oversized_frame_raises(self):
+        decoder = collector.FrameDecoder(4)
+        self.assertRaises(collector.FrameTooLargeError,
+                          decoder.feed, collector.encode_frame(["hello"]))
+
+
+class TestLogCollector(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.address = os.path.join(self.tmpdir, "collector.sock")
+        self.stream = io.BytesIO()
+        self.collector = collector.LogCollector(self.address, self.stream)
+
+    def tearDown(self):
+        self.collector.close()
+        shutil.rmtree(self.tmpdir)
+
+    def get_logger(self, handler):
+        handler.setFormatter(jsonlogging.get_json_formatter())
+        logger = logging.getLogger("test_collector")
+        logger.propagate = False
+        logger.setLevel(logging.DEBUG)
+        logger.handlers = [handler]
+        return logger
+
+    def pump(self, times=5):
+        for _ in range(times):
+            self.collector.handle_events(0.01)
+        self.collector.flush()
+
+    def test_records_from_handlers_are_written_as_lines(self):
+        handlers = [collector.CollectorHandler(self.address, batch_size=3)
+                    for _ in range(2)]
+
+        for i, handler in enumerate(handlers):
+            logger = self.get_logger(handler)
+            for n in range(4):
+                logger.info("worker %d record %d", i, n)
+            handler.close()
+
+        self.pump()
+
+        lines = self.stream.getvalue().splitlines()
+        self.assertEqual(8, len(lines))
+        messages = sorted(json.loads(l)["message"]["formatted"]
+                          for l in lines)
+        self.assertEqual("worker 0 record 0", messages[0])
+        self.assertEqual(8, self.collector.get_stats()["records"])
+
+    def test_errors_are_sent_immediately(self):
+        handler = collector.CollectorHandler(self.address, batch_size=100)
+        logger = self.get_logger(handler)
+
+        logger.info("buffered")
+        self.assertEqual(1, handler.get_queue_depth())
+        logger.error("urgent")
+        self.assertEqual(0, handler.get_queue_depth())
+
+        self.pump()
+        self.assertEqual(2, len(self.stream.getvalue().splitlines()))
+        handler.close()
+
+    def test_partial_frame_from_crashed_worker_is_discarded(self):
+        worker = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        worker.connect(self.address)
+        worker.sendall(collector.encode_frame(["complete"]))
+        worker.sendall(collector.encode_frame(["incomplete"])[:-3])
+        worker.close()
+
+        self.pump()
+
+        self.assertEqual(b"complete\n", self.stream.getvalue())
+        self.assertEqual(1, self.collector.get_stats()["partial_frames"])
+
+    def test_forked_worker_does_not_keep_parent_connection(self):
+        handler = collector.CollectorHandler(self.address, batch_size=100)
+        logger = self.get_logger(handler)
+        logger.error("parent")
+        # Any other reference to the socket would keep an unclosed copy of
+        # the connection alive in the child.
+        parent_socket = handler._socket
+
+        child_ready, child_logged = os.pipe()
+        parent_done, child_exit = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                logger.error("child")
+                os.write(child_logged, b"x")
+                os.read(parent_done, 1)
+            finally:
+                os._exit(0)
+
+        try:
+            os.read(child_ready, 1)
+            handler.close()
+            self.pump()
+
+            # The collector saw EOF from the parent's connection even though
+            # the child is still running, leaving only the child's.
+            self.assertEqual(2, self.collector.get_stats()["connections"])
+            self.assertEqual(1, len(self.collector._clients))
+            self.assertEqual(
+                [b"parent", b"child"],
+                [json.loads(l)["message"]["raw"].encode("ascii")
+                 for l in self.stream.getvalue().splitlines()])
+        finally:
+            os.write(child_exit, b"x")
+            os.waitpid(pid, 0)
+            for fd in (child_ready, child_logged, parent_done, child_exit):
+                os.close(fd)
+
+    def test_records_are_dropped_when_collector_unavailable(self):
+        handler = collector.CollectorHandler(
+            os.path.join(self.tmpdir, "missing.sock"), batch_size=2)
+        logger = self.get_logger(handler)
+
+        for _ in range(3):
+            logger.info("lost")
+        handler.close()
+
+        self.assertEqual(3, handler.get_dropped_count())
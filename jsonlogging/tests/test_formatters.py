@@ -8,6 +8,7 @@ from mock import MagicMock, sentinel
 from jsonlogging import values
 from jsonlogging import recordadapter
 from jsonlogging import formatters
+from jsonlogging import metrics
 
 
 class TestJsonFormatter(unittest.TestCase):
@@ -53,6 +54,38 @@ class TestJsonFormatter(unittest.TestCase):
         mock_adapter.to_json.assert_called_once_with(sentinel.log_record)
         mock_encoder.encode.assert_called_once_with(sentinel.adapter_result)
 
+    def test_metrics_are_recorded(self):
+        mock_adapter = MagicMock()
+        mock_adapter.to_json.return_value = {"this_is": "json"}
+        formatter = formatters.JsonFormatter(
+            formatters.default_json_encoder(), mock_adapter,
+            metrics.Metrics())
+
+        formatter.format(logging.makeLogRecord({}))
+        formatter.format(logging.makeLogRecord({"exc_info": sentinel.exc}))
+        mock_adapter.to_json.side_effect = ValueError()
+        self.assertRaises(ValueError, formatter.format,
+                          logging.makeLogRecord({}))
+
+        snapshot = formatter.get_metrics().snapshot()
+        self.assertEqual({
+            "records_formatted": 2,
+            "chars_emitted": 2 * len('{"this_is":"json"}'),
+            "exceptions_rendered": 1,
+            "format_errors": 1
+        }, snapshot["counters"])
+        self.assertEqual(2, snapshot["histograms"]["encode_seconds"]["count"])
+
+    def test_get_json_formatter_metrics_can_be_disabled(self):
+        self.assertIsInstance(
+            formatters.get_json_formatter().get_metrics(), metrics.Metrics)
+        self.assertIsNone(
+            formatters.get_json_formatter(metrics=False).get_metrics())
+
+        shared = metrics.Metrics()
+        self.assertIs(
+            shared, formatters.get_json_formatter(metrics=shared).get_metrics())
+
 
 class TestWrappedJsonFormatter(unittest.TestCase):
     def test_wrapped_formatter_wraps_json(self):
@@ -0,0 +1,67 @@
+import logging
+import unittest
+
+from mock import MagicMock
+
+import jsonlogging
+from jsonlogging import metrics
+
+
+class TestHistogram(unittest.TestCase):
+    def test_values_are_counted_in_buckets(self):
+        histogram = metrics.Histogram([1, 10])
+        for value in [0.5, 1, 5, 50, 100]:
+            histogram.observe(value)
+
+        snapshot = histogram.snapshot()
+        self.assertEqual([[1, 2], [10, 1], [None, 2]], snapshot["buckets"])
+        self.assertEqual(5, snapshot["count"])
+        self.assertEqual(156.5, snapshot["sum"])
+        self.assertEqual(100, snapshot["max"])
+
+
+class TestMetrics(unittest.TestCase):
+    def test_snapshot(self):
+        m = metrics.Metrics()
+        m.increment("records")
+        m.increment("records", 2)
+        m.observe("encode_seconds", 0.001)
+        m.add_gauge("queue_depth", lambda: 7)
+
+        snapshot = m.snapshot()
+        self.assertEqual({"records": 3}, snapshot["counters"])
+        self.assertEqual({"queue_depth": 7}, snapshot["gauges"])
+        self.assertEqual(1, snapshot["histograms"]["encode_seconds"]["count"])
+        self.assertEqual(3, m.get("records"))
+        self.assertEqual(0, m.get("missing"))
+
+    def test_snapshot_of_several_sources(self):
+        formatter = jsonlogging.get_json_formatter()
+        formatter.format(logging.makeLogRecord({"msg": "hi"}))
+
+        snapshot = metrics.snapshot(
+            {"formatter": formatter, "other": metrics.Metrics()})
+
+        self.assertEqual(
+            1, snapshot["formatter"]["counters"]["records_formatted"])
+        self.assertEqual({}, snapshot["other"]["counters"])
+
+    def test_sources_without_metrics_are_skipped(self):
+        formatter = jsonlogging.get_json_formatter(metrics=False)
+
+        snapshot = metrics.snapshot(
+            {"formatter": formatter, "other": metrics.Metrics()})
+
+        self.assertEqual(["other"], list(snapshot))
+
+
+class TestMetricsReporter(unittest.TestCase):
+    def test_report_logs_snapshot_as_args(self):
+        logger = MagicMock()
+        m = metrics.Metrics()
+        m.increment("records")
+
+        metrics.MetricsReporter({"test": m}, logger=logger).report()
+
+        logger.info.assert_called_once_with(
+            "jsonlogging metrics", {"test": m.snapshot()})
@@ -0,0 +1,124 @@
+import logging
+import unittest
+
+from mock import MagicMock, patch
+
+from jsonlogging import shedding
+
+
+class TestSheddingHandler(unittest.TestCase):
+    def setUp(self):
+        self.handled = []
+        self.target = MagicMock()
+        self.target.handle.side_effect = self.handled.append
+        self.now = 1000.0
+
+        patcher = patch("jsonlogging.shedding.time")
+        self.addCleanup(patcher.stop)
+        patcher.start().time.side_effect = lambda: self.now
+
+    def record(self, level, name="test"):
+        return logging.makeLogRecord({
+            "name": name, "levelno": level,
+            "levelname": logging.getLevelName(level), "msg": "msg"
+        })
+
+    def log(self, handler, level, count, name="test"):
+        for _ in range(count):
+            handler.handle(self.record(level, name))
+
+    def test_records_within_budget_are_passed_on(self):
+        handler = shedding.SheddingHandler(self.target, records_per_second=5)
+        self.log(handler, logging.DEBUG, 5)
+
+        self.assertEqual(5, len(self.handled))
+        self.assertEqual(0, handler.get_dropped_count())
+
+    def test_budget_resets_each_second(self):
+        handler = shedding.SheddingHandler(self.target, records_per_second=5)
+        self.log(handler, logging.DEBUG, 10)
+        self.now += 1
+        self.log(handler, logging.DEBUG, 5)
+
+        self.assertEqual(10, len(self.handled))
+        self.assertEqual(5, handler.get_dropped_count())
+
+    def test_errors_are_never_dropped(self):
+        handler = shedding.SheddingHandler(self.target, records_per_second=0)
+        self.log(handler, logging.ERROR, 10)
+        self.log(handler, logging.CRITICAL, 10)
+
+        self.assertEqual(20, len(self.handled))
+
+    def test_only_debug_and_info_are_shed_by_default(self):
+        handler = shedding.SheddingHandler(self.target, records_per_second=0)
+        self.log(handler, logging.DEBUG, 100)
+        self.log(handler, logging.INFO, 100)
+        self.log(handler, logging.WARNING, 100)
+
+        levels = [r.levelno for r in self.handled]
+        self.assertEqual(0, levels.count(logging.DEBUG))
+        self.assertEqual(10, levels.count(logging.INFO))
+        self.assertEqual(100, levels.count(logging.WARNING))
+
+    def test_low_levels_are_sampled_when_overloaded(self):
+        handler = shedding.SheddingHandler(
+            self.target, records_per_second=0, protect_level=logging.ERROR,
+            sample_rates={logging.INFO: 10, logging.WARNING: 2})
+        self.log(handler, logging.DEBUG, 100)
+        self.log(handler, logging.INFO, 100)
+        self.log(handler, logging.WARNING, 100)
+
+        levels = [r.levelno for r in self.handled]
+        self.assertEqual(0, levels.count(logging.DEBUG))
+        self.assertEqual(10, levels.count(logging.INFO))
+        self.assertEqual(50, levels.count(logging.WARNING))
+
+    def test_protect_level_above_error_is_rejected(self):
+        self.assertRaises(ValueError, shedding.SheddingHandler, self.target,
+                          protect_level=logging.CRITICAL)
+
+    def test_sample_rates_below_one_are_rejected(self):
+        self.assertRaises(ValueError, shedding.SheddingHandler, self.target,
+                          sample_rates={logging.INFO: 0})
+
+    def test_queue_depth_limit(self):
+        self.target.get_queue_depth.return_value = 50
+        handler = shedding.SheddingHandler(
+            self.target, max_queue_depth=50, sample_rates={})
+        self.log(handler, logging.INFO, 3)
+        self.log(handler, logging.ERROR, 1)
+
+        self.assertEqual([logging.ERROR], [r.levelno for r in self.handled])
+
+    def test_summary_counts_drops_by_logger_and_level(self):
+        handler = shedding.SheddingHandler(
+            self.target, records_per_second=0, sample_rates={},
+            summary_interval=60)
+        self.log(handler, logging.DEBUG, 3, name="a")
+        self.log(handler, logging.INFO, 2, name="a")
+        self.log(handler, logging.INFO, 4, name="b")
+        self.assertEqual([], self.handled)
+
+        self.now += 60
+        self.log(handler, logging.DEBUG, 1, name="a")
+
+        self.assertEqual(1, len(self.handled))
+        summary = self.handled[0]
+        self.assertEqual(logging.WARNING, summary.levelno)
+        self.assertEqual("jsonlogging.shedding", summary.name)
+        self.assertEqual(10, summary.args["total"])
+        self.assertEqual({"a": {"DEBUG": 4, "INFO": 2}, "b": {"INFO": 4}},
+                         summary.args["dropped"])
+        self.assertEqual("Shed 10 log records in the last 60.0 seconds",
+                         summary.getMessage())
+
+    def test_close_emits_final_summary(self):
+        handler = shedding.SheddingHandler(self.target, records_per_second=0,
+                                           sample_rates={})
+        self.log(handler, logging.DEBUG, 2)
+        handler.close()
+
+        self.assertEqual(2, self.handled[0].args["total"])
+        self.target.flush.assert_called_once_with()
+        self.assertFalse(self.target.close.called)
@@ -0,0 +1,161 @@
+import json
+import logging
+import socket
+import time
+import unittest
+
+from mock import MagicMock, patch
+
+import jsonlogging
+from jsonlogging import shipper
+
+
+class TestShipperHandler(unittest.TestCase):
+    def get_logger(self, handler):
+        handler.setFormatter(jsonlogging.get_json_formatter())
+        logger = logging.getLogger("test_shipper")
+        logger.propagate = False
+        logger.setLevel(logging.DEBUG)
+        logger.handlers = [handler]
+        return logger
+
+    def ship(self, protocol, count, **kwargs):
+        server = shipper.LocalLineServer(protocol, **kwargs)
+        self.addCleanup(server.close)
+        host, port = server.get_address()
+        handler = shipper.ShipperHandler(
+            host, port, protocol=protocol, batch_size=10,
+            flush_interval=0.01, **kwargs)
+        logger = self.get_logger(handler)
+
+        for i in range(count):
+            logger.info("record %d", i)
+
+        self.assertTrue(server.wait_for_lines(count))
+        handler.close()
+        return server, handler
+
+    def assert_lines_are_records(self, lines, count):
+        messages = [json.loads(line)["message"]["formatted"]
+                    for line in lines]
+        self.assertEqual(["record %d" % i for i in range(count)], messages)
+
+    def test_tcp_lines_are_delivered_in_order(self):
+        server, handler = self.ship("tcp", 35)
+        self.assert_lines_are_records(server.get_lines(), 35)
+        self.assertEqual(35, handler.get_sent_count())
+        self.assertEqual(0, handler.get_dropped_count())
+
+    def test_tcp_length_prefixed_frames(self):
+        server, _ = self.ship("tcp", 12, length_prefixed=True)
+        self.assert_lines_are_records(server.get_lines(), 12)
+
+    def test_udp_lines_are_delivered(self):
+        server, _ = self.ship("udp", 20)
+        self.assert_lines_are_records(server.get_lines(), 20)
+
+    def test_reconnects_after_peer_disconnects(self):
+        server = shipper.LocalLineServer("tcp")
+        self.addCleanup(server.close)
+        host, port = server.get_address()
+        handler = shipper.ShipperHandler(
+            host, port, flush_interval=0.01, min_backoff=0.01)
+        logger = self.get_logger(handler)
+
+        logger.info("before")
+        self.assertTrue(server.wait_for_lines(1))
+        server.disconnect_clients()
+
+        # The first send after the disconnect may be lost in the socket
+        # buffer, but the handler must reconnect for later sends.
+        for i in range(50):
+            logger.info("after")
+            if server.wait_for_lines(2, timeout=0.05):
+                break
+        self.assertTrue(server.get_line_count() >= 2)
+        handler.close()
+
+    def get_unused_port(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+        sock.close()
+        return port
+
+    def test_udp_failure_part_way_through_batch_is_not_resent(self):
+        sock = MagicMock()
+        sock.send.side_effect = [None, socket.error(111, "refused")]
+        with patch.object(shipper.ShipperHandler, "_connect",
+                          return_value=sock):
+            # Each short line gets a datagram, and a batch holds two lines
+            handler = shipper.ShipperHandler(
+                "127.0.0.1", self.get_unused_port(), protocol="udp",
+                batch_bytes=10, flush_interval=10, min_backoff=0.01)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            handler.handle(logging.makeLogRecord({"msg": "line-0"}))
+            handler.handle(logging.makeLogRecord({"msg": "line-1"}))
+            handler.close()
+
+        self.assertEqual(2, sock.send.call_count)
+        metrics = handler.get_metrics()
+        self.assertEqual(1, metrics.get("records_sent"))
+        self.assertEqual(1, metrics.get("records_dropped"))
+        self.assertEqual(1, metrics.get("send_errors"))
+        self.assertEqual(0, metrics.get("batches_sent"))
+
+    def test_udp_to_closed_port_counts_each_record_once(self):
+        handler = shipper.ShipperHandler(
+            "127.0.0.1", self.get_unused_port(), protocol="udp",
+            batch_bytes=200, flush_interval=0.01)
+        logger = self.get_logger(handler)
+        for i in range(10):
+            logger.info("record %d", i)
+        handler.flush()
+        handler.close()
+
+        metrics = handler.get_metrics()
+        self.assertEqual(
+            10, metrics.get("records_sent") + metrics.get("records_dropped"))
+
+    def test_tcp_batch_is_counted_once_after_retry(self):
+        sock = MagicMock()
+        sock.sendall.side_effect = [socket.error(104, "reset"), None]
+        with patch.object(shipper.ShipperHandler, "_connect",
+                          return_value=sock):
+            handler = shipper.ShipperHandler(
+                "127.0.0.1", self.get_unused_port(), batch_size=5,
+                flush_interval=10, min_backoff=0.01)
+            logger = self.get_logger(handler)
+            for i in range(5):
+                logger.info("record %d", i)
+
+            deadline = time.time() + 5
+            while handler.get_sent_count() < 5 and time.time() < deadline:
+                time.sleep(0.01)
+            handler.close()
+
+        self.assertEqual(2, sock.sendall.call_count)
+        metrics = handler.get_metrics()
+        self.assertEqual(5, metrics.get("records_sent"))
+        self.assertEqual(0, metrics.get("records_dropped"))
+        self.assertEqual(1, metrics.get("send_errors"))
+
+    def test_records_are_dropped_when_queue_is_full(self):
+        port = self.get_unused_port()
+
+        # The background thread holds at most one batch while it backs off
+        handler = shipper.ShipperHandler(
+            "127.0.0.1", port, queue_size=5, batch_size=5,
+            flush_interval=0.01, min_backoff=10)
+        logger = self.get_logger(handler)
+        for _ in range(20):
+            logger.info("lost")
+
+        self.assertTrue(handler.get_dropped_count() >= 10)
+        self.assertTrue(handler.get_queue_depth() <= 5)
+        handler.close(timeout=1)
+        self.assertEqual(20, handler.get_dropped_count())
+
+    def test_invalid_protocol_is_rejected(self):
+        self.assertRaises(ValueError, shipper.ShipperHandler,
+                          "localhost", 1234, protocol="sctp")
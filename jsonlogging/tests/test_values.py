@@ -1,11 +1,13 @@
 import datetime
+import json
 import logging
 import sys
 import time
 import traceback
 import unittest
+from collections import OrderedDict
 
-from jsonlogging import values
+from jsonlogging import recordadapter, values
 
 
 class TestRecordValue(unittest.TestCase):
@@ -126,6 +128,54 @@ class TestExceptionRelatedRecordValue(unittest.TestCase):
         )
 
 
+class TestTruncatedMessageRecordValue(unittest.TestCase):
+    def render(self, msg, args, **limits):
+        record = logging.makeLogRecord({"msg": msg, "args": args})
+        return values.TruncatedMessageRecordValue(**limits).render(record)
+
+    def test_small_messages_match_formatted_message(self):
+        for (msg, args) in [("%s and %d", ("a", 1)),
+                            ("%(a)s %(b)r", {"a": "x", "b": (1, 2)}),
+                            ("%s", ({"a": 1},)),
+                            ("no args", ())]:
+            record = logging.makeLogRecord({"msg": msg, "args": args})
+            self.assertEqual(
+                values.FormattedMessageRecordValue().render(record),
+                values.TruncatedMessageRecordValue(
+                    max_size=1000, max_items=10).render(record)
+            )
+
+    def test_args_are_truncated_before_formatting(self):
+        self.assertEqual(
+            "items: ['a', 'b', '...[999998 more items]']",
+            self.render("items: %s", (["a", "b"] * 500000,), max_items=2))
+
+    def test_only_referenced_dict_args_are_copied(self):
+        looked_up = []
+
+        class Args(dict):
+            def __getitem__(self, key):
+                looked_up.append(key)
+                return dict.__getitem__(self, key)
+
+        args = Args(used="x" * 100, unused=["y"] * 10 ** 6)
+        # The arg is cut to 30 chars and then so is the whole message
+        self.assertEqual(
+            "used: " + "x" * 24 + "...[24 more chars]",
+            self.render("used: %(used)s", args, max_string_length=30))
+        # Python 2 repeats the lookup when a byte string message is formatted
+        # with a unicode arg, but the unused arg is never touched.
+        self.assertEqual(set(["used"]), set(looked_up))
+
+    def test_message_is_truncated(self):
+        self.assertEqual(
+            "abc...[7 more chars]",
+            self.render("abcdefghij", (), max_string_length=3))
+
+    def test_non_string_msg_renders_to_none(self):
+        self.assertIsNone(self.render({"a": 1}, ()))
+
+
 class TestOrderedObjectValue(unittest.TestCase):
 
     def test_empty_oov_renders_to_none(self):
@@ -215,3 +265,116 @@ class TestOrderedObjectValue(unittest.TestCase):
         nested = json["nested"]
         self.assertEqual(1, len(nested))
         self.assertEqual(["nested_path"], nested.keys())
+
+
+class TestExceptionTracebackFrameLimits(unittest.TestCase):
+    def setUp(self):
+        def recurse(n):
+            if n == 0:
+                raise ValueError("bottom")
+            recurse(n - 1)
+
+        try:
+            recurse(50)
+        except ValueError:
+            self.record = logging.makeLogRecord({"exc_info": sys.exc_info()})
+
+    def test_middle_frames_are_omitted(self):
+        value = values.ExceptionTracebackRecordValue(
+            head_frames=2, tail_frames=3)
+        trace = value.render(self.record)
+
+        self.assertEqual(6, len(trace))
+        self.assertEqual("setUp", trace[0]["function"])
+        self.assertEqual({"omitted_frames": 47}, trace[2])
+        self.assertEqual("recurse", trace[-1]["function"])
+        self.assertEqual('raise ValueError("bottom")', trace[-1]["code"])
+
+    def test_subclass_without_super_init_is_not_limited(self):
+        class CustomTracebackValue(values.ExceptionTracebackRecordValue):
+            def __init__(self):
+                pass
+
+        self.assertEqual(
+            values.ExceptionTracebackRecordValue().render(self.record),
+            CustomTracebackValue().render(self.record)
+        )
+
+    def test_short_traceback_is_not_limited(self):
+        value = values.ExceptionTracebackRecordValue(
+            head_frames=100, tail_frames=100)
+        self.assertEqual(
+            values.ExceptionTracebackRecordValue().render(self.record),
+            value.render(self.record)
+        )
+
+
+class TestTruncatedValue(unittest.TestCase):
+    def render(self, json, **limits):
+        record = logging.makeLogRecord({"args": json})
+        return values.TruncatedValue(
+            values.RecordValue("args"), **limits).render(record)
+
+    def test_values_within_limits_are_unchanged(self):
+        json = {"a": [1, 2.5, None, True], "b": "hello"}
+        self.assertEqual(json, self.render(
+            json, max_size=1000, max_string_length=5, max_items=4,
+            max_depth=2))
+
+    def test_long_strings_are_truncated(self):
+        self.assertEqual("abc...[7 more chars]",
+                         self.render("abcdefghij", max_string_length=3))
+
+    def test_utf8_byte_strings_are_cut_between_characters(self):
+        actual = self.render("caf\xc3\xa9 au lait", max_string_length=4)
+
+        self.assertEqual(u"caf\xe9...[8 more chars]", actual)
+        # The truncated value must still be encodable
+        self.assertEqual('"caf\\u00e9...[8 more chars]"', json.dumps(actual))
+
+    def test_lists_and_objects_are_capped(self):
+        json = OrderedDict((str(i), range(10)) for i in range(5))
+        actual = self.render(json, max_items=2)
+
+        self.assertEqual(["0", "1", "..."], actual.keys())
+        self.assertEqual([0, 1, "...[8 more items]"], actual["0"])
+        self.assertEqual("...[3 more items]", actual["..."])
+
+    def test_deep_nesting_is_cut_off(self):
+        self.assertEqual([["...[1 more items]"]],
+                         self.render([[[[[1]]]]], max_depth=2))
+
+    def test_max_size_bounds_encoded_size(self):
+        huge = OrderedDict([
+            ("payload", ["x" * 1000] * 100000),
+            ("more", ["y" * 1000] * 100000)
+        ])
+        actual = self.render(huge, max_size=500)
+
+        encoded = json.dumps(actual, separators=(",", ":"))
+        self.assertTrue(len(encoded) < 600, len(encoded))
+        self.assertTrue(actual["payload"][-1].endswith("more items]"))
+        self.assertEqual("...[1 more items]", actual["..."])
+
+    def test_record_budget_keeps_small_fields(self):
+        """
+        A large message mustn't push the record's name, level and time out
+        of a per-record budget.
+        """
+        record = logging.makeLogRecord({
+            "name": "test", "levelname": "INFO", "msg": "x" * 10 ** 6,
+            "args": ()
+        })
+        template = values.TruncatedValue(
+            recordadapter.default_template(), max_size=200)
+
+        actual = template.render(record)
+
+        self.assertEqual("test", actual["name"])
+        self.assertEqual("INFO", actual["level"])
+        self.assertTrue("time" in actual)
+        self.assertEqual(
+            ["message", "name", "level", "time"], actual.keys()[:4])
+        self.assertTrue(len(json.dumps(actual)) < 400)
+        # location, process and thread are nested objects which don't fit
+        self.assertEqual("...[3 more items]", actual["..."])
@@ -2,13 +2,30 @@
 This module contains a number of Value implementations. These Value classes
 have a single method: render(record) which pull out and return a value
 from a logging.LogRecord instance.
+
+Values may also have a get_record_attributes() method which returns the set
+of LogRecord attribute names that render() uses. This allows the work done
+to populate unused attributes to be skipped (see the capture module).
 """
 
 import datetime
+import itertools
+import sys
 import traceback
 from collections import OrderedDict
 
 
+def get_record_attributes(value):
+    """
+    Get the set of LogRecord attribute names used by a Value, or None if the
+    Value doesn't say which attributes it uses.
+    """
+    get_attributes = getattr(value, "get_record_attributes", None)
+    if get_attributes is None:
+        return None
+    return get_attributes()
+
+
 class OrderedObjectValue(object):
     """
     A Value implementation which is used to create a JSON object literal
@@ -41,6 +58,15 @@ class OrderedObjectValue(object):
         # Return None if our dict is empty
         return value or None
 
+    def get_record_attributes(self):
+        attributes = set()
+        for (_, value) in self._entries:
+            value_attributes = get_record_attributes(value)
+            if value_attributes is None:
+                return None
+            attributes.update(value_attributes)
+        return attributes
+
 
 class RecordValue(object):
     """
@@ -53,6 +79,9 @@ class RecordValue(object):
     def render(self, record):
         return getattr(record, self._attr)
 
+    def get_record_attributes(self):
+        return set([self._attr])
+
 
 class DateRecordValue(object):
     """
@@ -75,6 +104,9 @@ class DateRecordValue(object):
     def render(self, record):
         return self.format_datetime(self.get_datetime(record))
 
+    def get_record_attributes(self):
+        return set([self.timestamp_attribute])
+
     def format_datetime(self, datetime):
         """
         Converts a datetime instance into a string representation. Subclasses
@@ -94,6 +126,9 @@ class FormattedMessageRecordValue(object):
             return record.getMessage()
         return None
 
+    def get_record_attributes(self):
+        return set(["msg", "args"])
+
 
 class BaseExcInfoRecordValue(object):
     """
@@ -105,6 +140,9 @@ class BaseExcInfoRecordValue(object):
             return None
         return self.exc_info_value(record.exc_info)
 
+    def get_record_attributes(self):
+        return set(["exc_info"])
+
 
 class ExceptionTypeRecordValue(BaseExcInfoRecordValue):
     """
@@ -133,14 +171,57 @@ class ExceptionMessageRecordValue(BaseExcInfoRecordValue):
 class ExceptionTracebackRecordValue(BaseExcInfoRecordValue):
     """
     A Value implementation which renders to the record's exception traceback.
+
+    Very deep tracebacks (e.g. from runaway recursion) can be limited by
+    passing `head_frames` and/or `tail_frames`. If the traceback has more
+    frames than their sum, only the first `head_frames` and last
+    `tail_frames` frames are rendered, with an entry recording the number
+    of omitted frames between them. Omitted frames are never looked up, so
+    the cost of rendering is bounded by the limits.
     """
+    # Defaults for subclasses whose __init__ doesn't call ours
+    _head_frames = None
+    _tail_frames = None
+
+    def __init__(self, head_frames=None, tail_frames=None):
+        self._head_frames = head_frames
+        self._tail_frames = tail_frames
+
     def exc_info_value(self, exc_info):
         _, _, tb = exc_info
 
-        return [
+        if self._head_frames is None and self._tail_frames is None:
+            return [
+                self.render_trace_entry(entry)
+                for entry in traceback.extract_tb(tb)
+            ]
+
+        head = self._head_frames or 0
+        tail = self._tail_frames or 0
+
+        # Walking the traceback is cheap, extracting the frames isn't
+        tbs = []
+        while tb is not None:
+            tbs.append(tb)
+            tb = tb.tb_next
+
+        if len(tbs) <= head + tail:
+            return [
+                self.render_trace_entry(entry)
+                for entry in traceback.extract_tb(tbs[0] if tbs else None)
+            ]
+
+        json = [
             self.render_trace_entry(entry)
-            for entry in traceback.extract_tb(tb)
-        ]
+            for entry in traceback.extract_tb(tbs[0], head)
+        ] if head else []
+        json.append(self.render_omitted_entry(len(tbs) - head - tail))
+        if tail:
+            json.extend(
+                self.render_trace_entry(entry)
+                for entry in traceback.extract_tb(tbs[-tail], tail)
+            )
+        return json
 
     def render_trace_entry(self, entry):
         filename, line_number, function_name, code_line = entry
@@ -152,3 +233,224 @@ class ExceptionTracebackRecordValue(BaseExcInfoRecordValue):
         if code_line:
             json["code"] = code_line
         return json
+
+    def render_omitted_entry(self, count):
+        json = OrderedDict()
+        json["omitted_frames"] = count
+        return json
+
+
+def _is_container(json):
+    return isinstance(json, (list, tuple, dict))
+
+
+# Bytes which start a UTF-8 character, i.e. all but continuation bytes
+_CHARACTER_BYTES = b"".join(
+    chr(byte) for byte in range(256) if not 0x80 <= byte < 0xC0)
+
+
+class TruncatedValue(object):
+    """
+    A Value implementation which limits the size of the JSON value produced
+    by another Value.
+
+    `max_string_length` limits the length of strings, `max_items` limits the
+    number of items in lists and objects and `max_depth` limits how deeply
+    lists and objects can nest. `max_size` is a budget for the approximate
+    size in characters of the whole encoded value. Within an object, the
+    budget is spent on entries which aren't lists or objects first, so a
+    large nested value can't push small fields such as a record's name or
+    level out of the object. After that the budget is spent in the order
+    the values would be encoded, so later entries are truncated first once
+    it runs out.
+
+    Wrap individual template entries to limit a single field, or the whole
+    template to limit the size of each record.
+
+    The limits are applied while copying the rendered value, and only the
+    parts which are kept are visited. Copying and encoding a 50MB args
+    object costs no more than copying and encoding the parts which fit
+    within the limits. However, the wrapped Value renders in full before
+    it's truncated. FormattedMessageRecordValue formats the whole of the
+    record's args into the message, so use TruncatedMessageRecordValue to
+    limit the message instead.
+
+    Copies keep the type of tuples and plain dicts, so they format the same
+    way as the original values.
+    """
+    string_marker = "...[{} more chars]"
+    items_marker = "...[{} more items]"
+    items_marker_key = "..."
+
+    def __init__(self, value, max_size=None, max_string_length=None,
+                 max_items=None, max_depth=None):
+        self._value = value
+        self._max_size = max_size
+        self._max_string_length = max_string_length
+        self._max_items = max_items
+        self._max_depth = max_depth
+
+    def render(self, record):
+        return self.truncate(self._value.render(record))
+
+    def get_record_attributes(self):
+        return get_record_attributes(self._value)
+
+    def truncate(self, json):
+        """
+        Get a copy of the JSON value `json` which respects this Value's
+        limits.
+        """
+        budget = [sys.maxsize if self._max_size is None else self._max_size]
+        return self._copy(json, 0, budget)
+
+    def _copy(self, json, depth, budget):
+        if isinstance(json, basestring):
+            return self._copy_string(json, budget)
+
+        is_list = isinstance(json, (list, tuple))
+        is_dict = isinstance(json, dict)
+        if not (is_list or is_dict):
+            budget[0] -= 8  # Roughly the size of a number, true, null etc
+            return json
+
+        if self._max_depth is not None and depth >= self._max_depth and json:
+            return self._copy_string(
+                self.items_marker.format(len(json)), budget)
+
+        if is_list:
+            return self._copy_list(json, depth, budget)
+        return self._copy_dict(json, depth, budget)
+
+    def _copy_string(self, string, budget):
+        limit = max(min(len(string), budget[0] - 2), 0)
+        if self._max_string_length is not None:
+            limit = min(limit, self._max_string_length)
+
+        if limit < len(string):
+            if isinstance(string, str):
+                string = self._truncate_byte_string(string, limit)
+            else:
+                string = (string[:limit] +
+                          self.string_marker.format(len(string) - limit))
+
+        budget[0] -= len(string) + 2
+        return string
+
+    def _truncate_byte_string(self, string, limit):
+        """
+        Truncate a UTF-8 byte string to `limit` characters. Cutting the bytes
+        could split a character, leaving a string the encoder can't decode.
+        """
+        # A character is at most 4 bytes, so this prefix holds the first
+        # `limit` characters. Only the prefix is decoded.
+        prefix = string[:limit * 4].decode("utf-8", "replace")
+        if len(prefix) <= limit and len(string) <= limit * 4:
+            return string
+
+        # Count the characters without decoding the whole string: every
+        # byte except continuation bytes starts a character.
+        length = len(string) - len(string.translate(None, _CHARACTER_BYTES))
+        return prefix[:limit] + self.string_marker.format(length - limit)
+
+    def _item_limit(self, container):
+        if self._max_items is None:
+            return len(container)
+        return min(len(container), self._max_items)
+
+    def _copy_list(self, items, depth, budget):
+        budget[0] -= 2
+        json = []
+        for item in itertools.islice(items, self._item_limit(items)):
+            if budget[0] <= 0:
+                break
+            json.append(self._copy(item, depth + 1, budget))
+            budget[0] -= 1
+
+        omitted = len(items) - len(json)
+        if omitted:
+            json.append(self.items_marker.format(omitted))
+            budget[0] -= len(json[-1]) + 2
+
+        if isinstance(items, tuple):
+            return tuple(json)
+        return json
+
+    def _copy_dict(self, entries, depth, budget):
+        budget[0] -= 2
+
+        # Every entry costs at least 6 chars (e.g. "":"",) so no more than
+        # this many can fit in the budget.
+        limit = min(self._item_limit(entries), max(budget[0], 0) // 6 + 1)
+        keys = list(itertools.islice(entries, limit))
+
+        copied = {}
+        for containers in (False, True):
+            for key in keys:
+                if _is_container(entries[key]) != containers:
+                    continue
+                if budget[0] <= 0:
+                    break
+                if isinstance(key, basestring):
+                    budget[0] -= len(key) + 3
+                else:
+                    budget[0] -= 8
+                copied[key] = self._copy(entries[key], depth + 1, budget)
+                budget[0] -= 1
+
+        json = OrderedDict(
+            (key, copied[key]) for key in keys if key in copied)
+        omitted = len(entries) - len(json)
+        if omitted:
+            json[self.items_marker_key] = self.items_marker.format(omitted)
+            budget[0] -= len(json[self.items_marker_key]) + 8
+
+        if type(entries) is dict:
+            return dict(json)
+        return json
+
+
+class TruncatedMessageRecordValue(FormattedMessageRecordValue):
+    """
+    A FormattedMessageRecordValue which limits the size of the record's args
+    before formatting them into the message.
+
+    Each arg is copied within the limits, which have the same meaning as
+    TruncatedValue's and apply to each arg separately. When the args are a
+    dict, only the args which the message refers to are copied. The
+    formatted message is then truncated to the limits too. The cost of
+    formatting depends on the limits and the length of the record's msg,
+    but not on the size of its args.
+    """
+    def __init__(self, max_size=None, max_string_length=None, max_items=None,
+                 max_depth=None):
+        self._truncator = TruncatedValue(
+            None, max_size, max_string_length, max_items, max_depth)
+
+    def render(self, record):
+        if not isinstance(record.msg, basestring):
+            return None
+
+        message = record.msg
+        args = record.args
+        if args:
+            if isinstance(args, tuple):
+                args = tuple(self._truncator.truncate(arg) for arg in args)
+            else:
+                args = _TruncatingMapping(args, self._truncator)
+            message = message % args
+        return self._truncator.truncate(message)
+
+
+class _TruncatingMapping(object):
+    """
+    A mapping which truncates the values of another mapping as they are
+    looked up, so that formatting a message with %(name)s placeholders only
+    copies the args the message uses.
+    """
+    def __init__(self, mapping, truncator):
+        self._mapping = mapping
+        self._truncator = truncator
+
+    def __getitem__(self, key):
+        return self._truncator.truncate(self._mapping[key])